@@ -1,12 +1,64 @@
-from fastapi import FastAPI
-from routes import files, auth, notes
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from routes import files, auth, notes, admin
+from sb_client import get_shared_client, shared_client_ready
+from services import renditions
 from fastapi.middleware.cors import CORSMiddleware
+from utils.responses import FastJSONResponse
+from utils.compression import CompressionMiddleware
+from utils.governor import Governor, GovernorMiddleware, Lane, RouteRule
+from utils.profiling import ProfilingMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The shared Supabase client is built lazily on first use. Set
+    # NOSH_WARMUP=1 to build it before serving instead; a failure there is
+    # logged and retried on the first request rather than killing the worker.
+    if os.getenv("NOSH_WARMUP") == "1":
+        try:
+            await run_in_threadpool(get_shared_client)
+        except Exception:
+            logger.exception("Supabase warmup failed; the client will be built on first use")
+
+    yield
+
+    renditions.shutdown()
+
 
 app = FastAPI(
     title="NOsh",
     description="Handles file uploads to Supabase Storage and stores comments/tags",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
+)
+
+# --- Admission control ---
+# Reads and heavy writes get separate slot pools so a bulk upload or a big
+# room delete can't eat every worker thread; heavy work also backs off while
+# reads are queueing. Registered before CORS so rejections still carry CORS headers.
+governor = Governor(
+    lanes=[
+        Lane("light", max_concurrency=64, max_queue=256, queue_timeout=2.0),
+        Lane("heavy", max_concurrency=8, max_queue=16, queue_timeout=5.0, per_user_concurrency=2),
+    ],
+    rules=[
+        RouteRule("POST", r"/files/upload", "heavy", rate=1, burst=10, route_rate=20, route_burst=40),
+        RouteRule("POST", r"/notes/notes/upload", "heavy", rate=1, burst=10, route_rate=20, route_burst=40),
+        RouteRule("DELETE", r"/notes/rooms/\d+", "heavy", rate=0.2, burst=3),
+        RouteRule("GET", r"/notes/rooms/\d+/export", "heavy", rate=0.05, burst=2),
+    ],
+    default_rule=RouteRule("*", r".*", "light", rate=20, burst=60),
+    priority_lane="light",
 )
+app.add_middleware(GovernorMiddleware, governor=governor, exempt_paths=("/metrics/governor", "/health/live", "/health/ready"))
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,10 +72,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for anything over ~1 KB (room and note listings compress very well)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+# Opt-in sampling profiler / slow-request capture (see utils/profiling.py for the
+# NOSH_PROFILE_* settings). Outermost so queueing time counts towards "slow".
+app.add_middleware(ProfilingMiddleware)
+
 # Mount file-related routes
 app.include_router(files.router, prefix="/files", tags=["File Operations"])
 
 app.include_router(auth.router , prefix="/auth", tags=["Authentication"])
 app.include_router(notes.router , prefix="/notes", tags=["notes"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
+
+# app.include_router(auth.router)
+
+
+@app.get("/health/live", tags=["Health"])
+def live():
+    return {"status": "ok"}
+
+
+@app.get("/health/ready", tags=["Health"])
+def ready():
+    # Builds the shared client if nothing has yet, so this doubles as a warmup hook
+    if not shared_client_ready():
+        try:
+            get_shared_client()
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Supabase client unavailable: {str(e)}")
+    return {"status": "ready"}
+
 
-# app.include_router(auth.router) 
+@app.get("/metrics/governor", tags=["Metrics"])
+def governor_metrics():
+    return governor.stats() 
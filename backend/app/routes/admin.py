@@ -0,0 +1,63 @@
+import os
+import secrets
+from collections import Counter
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from utils.profiling import profiler
+
+router = APIRouter()
+
+ADMIN_TOKEN = os.getenv("NOSH_ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    # No token configured means the admin surface is switched off entirely
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+def list_profiles(slow_only: bool = False):
+    traces = [t for t in profiler.traces if t.slow_stacks or not slow_only]
+    return {
+        "config": {
+            "rate": profiler.rate,
+            "routes": list(profiler.routes),
+            "slow_ms": profiler.slow_ms,
+            "interval_ms": profiler.interval * 1000,
+            "buffer_size": profiler.traces.maxlen,
+        },
+        "profiles": [t.summary() for t in reversed(traces)],
+    }
+
+
+@router.get("/profiles/flamegraph", dependencies=[Depends(require_admin)], response_class=PlainTextResponse)
+def flamegraph_all(path: str = None):
+    """Collapsed stacks merged across every buffered profile (optionally one path)."""
+    merged = Counter()
+    for trace in profiler.traces:
+        if path and trace.path != path:
+            continue
+        merged.update(trace.samples)
+        merged.update({stack: 1 for stack in trace.slow_stacks.values()})
+    return "".join(f"{stack} {count}\n" for stack, count in merged.items())
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: int):
+    trace = profiler.get(profile_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Profile not found or evicted")
+    return trace.detail()
+
+
+@router.get("/profiles/{profile_id}/flamegraph", dependencies=[Depends(require_admin)], response_class=PlainTextResponse)
+def get_profile_flamegraph(profile_id: int):
+    trace = profiler.get(profile_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Profile not found or evicted")
+    return trace.collapsed()
@@ -1,19 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, Header
 from fastapi.responses import JSONResponse, RedirectResponse
 from pydantic import BaseModel
-from gotrue.errors import AuthApiError
-from sb_client import get_supabase_client
+from sb_client import supabase
 
 from urllib.parse import urlencode
 from functools import lru_cache
 from dotenv import load_dotenv
 import os
-import bcrypt
 
 load_dotenv()
 
 router = APIRouter()
-supabase = get_supabase_client()
 
 SUPABASE_URL = os.getenv("SUPABASE_PURL")
 GOOGLE_REDIRECT_URL = "http://localhost:3000/auth/callback"
@@ -33,6 +30,8 @@ class SignUpRequest(BaseModel):
 
 # --- Utility: Hash password ---
 def hash_password(password: str) -> str:
+    import bcrypt  # deferred: only signup/sync-user need it
+
     return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
 
@@ -102,6 +101,8 @@ async def sync_user(payload: dict):
 # --- Sign in (set cookies) ---
 @router.post("/signin")
 def login(payload: SignUpRequest):
+    from gotrue.errors import AuthApiError
+
     try:
         result = supabase.auth.sign_in_with_password({
             "email": payload.email,
@@ -152,9 +153,6 @@ def store_token(data: dict, response: Response):
     return JSONResponse(content={"message": "Token stored"})
 
 
-import httpx
-
-
 # --- Get current user ---
 # @router.get("/me")
 # async def get_me(user=Depends(get_current_user)):
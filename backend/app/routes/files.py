@@ -1,10 +1,10 @@
 
 from fastapi import FastAPI, APIRouter, UploadFile, Form, Depends, Request, HTTPException
-from sb_client import get_supabase_client
+from sb_client import supabase
+from services import room_summaries
 
 from routes.auth import get_me
 
-supabase = get_supabase_client()
 
 router = APIRouter()    
 
@@ -43,4 +43,7 @@ async def upload_file(
     "owner_id": user_id
 }).execute()
 
+    if notesroom_id.isdigit():
+        room_summaries.file_uploaded(int(notesroom_id), file_path, len(contents))
+
     return {"upload": upload_resp, "metadata": meta_resp}
\ No newline at end of file
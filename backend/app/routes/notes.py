@@ -1,12 +1,18 @@
+import logging
 import os
 import time
 import mimetypes
 from typing import Dict, Optional, List
 from fastapi import APIRouter, Form, File, UploadFile, Request, HTTPException, Header, Depends
-from sb_client import get_supabase_client
+from fastapi.responses import StreamingResponse
+from sb_client import supabase
+from services.room_export import stream_room_zip, stream_room_ndjson
+from services.renditions import schedule_renditions, attach_rendition_urls, is_renderable
+from services import access, room_summaries
+from services.access import resolve_user_id, require_room_access, require_note_access, WRITE_ROLES, OWNER_ROLES
 
-supabase = get_supabase_client()
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # --- Core Upload Logic ---
 async def upload_note(
@@ -18,6 +24,7 @@ async def upload_note(
     tags: Optional[List[str]],
 ) -> dict:
     file_url, file_type = None, None
+    attachment_bytes = 0
 
     # File Handling
     if file:
@@ -36,10 +43,14 @@ async def upload_note(
         file_ext = mimetypes.guess_extension(content_type) or ".bin"
         file_path = f"{user_id}/{safe_title}{file_ext}"
         file_bytes = await file.read()
+        attachment_bytes = len(file_bytes)
 
         upload_response = supabase.storage.from_("note-files").upload(
             path=file_path, file=file_bytes, file_options={"content-type": content_type}
         )
+        # Thumbnails / web-size previews (first page for PDFs) are built in the background
+        if file_type in ('image', 'pdf') and is_renderable(file_path):
+            schedule_renditions(supabase, file_path, file_bytes, content_type)
         # Use .get_public_url() correctly (returns dict with 'publicUrl')
         file_url = supabase.storage.from_("note-files").create_signed_url(file_path, 3600)
         # file_url = public_url_response.get("publicUrl") if isinstance(public_url_response, dict) else public_url_response
@@ -79,6 +90,7 @@ async def upload_note(
         note_tag_links = [{"note_id": note_id, "tag_id": tag_id} for tag_id in tag_ids]
         supabase.from_("note_tags").insert(note_tag_links).execute()
 
+    room_summaries.note_created(room_id, note_id, user_id, attachment_bytes)
     return new_note
 
 
@@ -133,27 +145,9 @@ async def create_note_endpoint(
     file: Optional[UploadFile] = File(None),
     access_token: str = Depends(get_token_from_header),
 ):
-   
-
-    try:
-        user = supabase.auth.get_user(access_token).user
-        email = user.email
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token.")
-
-    # Step 2: Find user in `users` table using email (no auth_uuid)
-    try:
-        profile_response = supabase.from_("users")\
-            .select("id")\
-            .eq("email", "gd@gmail.com")\
-            .single()\
-            .execute()
-        
-        user_id = profile_response.data["id"]
-        # print(profile_response)
-    except Exception:
-        # print("Error fetching user profile:", profile_response)
-        raise HTTPException(status_code=404, detail="User not found in database." )
+    # Step 1 & 2: Resolve the caller's user id (cached) and check they can write to the room
+    user_id = resolve_user_id(access_token)
+    require_room_access(user_id, room_id, WRITE_ROLES)
 
     # Step 3: Call note upload logic
     tag_list = [tag.strip() for tag in tags.split(",")] if tags else []
@@ -167,6 +161,7 @@ async def create_note_endpoint(
             file=file,
             tags=tag_list
         )
+        access.remember_note_room(new_note["id"], room_id)
         return {
             "status": "success",
             "message": "Note uploaded successfully!",
@@ -224,19 +219,8 @@ async def create_note_endpoint(
     
 @router.post("/rooms/create")
 def create_room(request: Request, name: str = Form(...),access_token: str = Depends(get_token_from_header)):
-  
-    try:
-        user = supabase.auth.get_user(access_token).user
-        email = user.email
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-    try:
-        # Fetch internal user ID
-        profile_response = supabase.from_("users").select("id").eq("email", email).single().execute()
-        user_id = profile_response.data["id"]
-    except Exception:
-        raise HTTPException(status_code=404, detail="User not found")
+    # Fetch internal user ID
+    user_id = resolve_user_id(access_token)
 
     # Insert room
     try:
@@ -248,6 +232,8 @@ def create_room(request: Request, name: str = Form(...),access_token: str = Depe
         if not room_response.data:
             raise Exception(f"Failed to create room: {room_response.error.message}")
 
+        access.room_created(user_id, room_response.data[0]["id"])
+        room_summaries.room_created(room_response.data[0]["id"])
         return {"status": "success", "room": room_response.data[0]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Room creation failed: {str(e)}")
@@ -256,32 +242,18 @@ def create_room(request: Request, name: str = Form(...),access_token: str = Depe
 
 @router.get("/your-api/rooms/list")
 async def list_rooms(access_token: str = Depends(get_token_from_header)):
-    # Step 1: Get access token from cookie
-   
-
-    # Step 2: Validate token and get user email
-    try:
-        user = supabase.auth.get_user(access_token).user
-        email = user.email
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    # Step 1-3: Validate token and get internal user ID
+    user_id = resolve_user_id(access_token)
 
-    # Step 3: Get internal user ID
+    # Step 4: Fetch rooms created by user, with their precomputed summaries embedded
     try:
-        profile_response = supabase.from_("users").select("id").eq("email", email).single().execute()
-        user_id = profile_response.data["id"]
-    except Exception:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Step 4: Fetch rooms created by user
-    try:
-        rooms_response = supabase.from_("rooms").select("*").eq("created_by", user_id).execute()
+        rooms_response = supabase.from_("rooms").select("*, room_summaries(*)").eq("created_by", user_id).execute()
         rooms = rooms_response.data or []
+        # We already have the full room list, so refresh the access cache for free
+        access.prime_user_rooms(user_id, rooms)
 
-        # Count notes for each room
-        for room in rooms:
-            note_count_response = supabase.from_("notes").select("id", count="exact").eq("room_id", room["id"]).execute()
-            room["notes_count"] = note_count_response.count or 0
+        # notes_count, attachment_bytes, contributor_count, last_activity
+        room_summaries.attach_summaries(rooms)
 
         return {"status": "success", "rooms": rooms}
     except Exception as e:
@@ -331,21 +303,54 @@ async def list_rooms(access_token: str = Depends(get_token_from_header)):
 #         raise HTTPException(status_code=500, detail=f"Failed to fetch rooms: {str(e)}")
 
 @router.get("/by-room/{room_id}")
-async def get_notes_by_room(room_id: int):
+async def get_notes_by_room(room_id: int, access_token: str = Depends(get_token_from_header)):
+    user_id = resolve_user_id(access_token)
+    require_room_access(user_id, room_id)
+
     response = supabase.from_("notes").select("*").eq("room_id", room_id).execute()
     if not response.data:
         raise HTTPException(status_code=404, detail="No notes found")
+    for note in response.data:
+        access.remember_note_room(note["id"], room_id)
+    try:
+        attach_rendition_urls(supabase, response.data)
+    except Exception:
+        # Previews are optional; the listing still works without them
+        logger.exception("Signing rendition URLs failed for room %s", room_id)
     return {"notes": response.data}
 
 
+@router.get("/rooms/{room_id}/export")
+def export_room(room_id: int, format: str = "zip", access_token: str = Depends(get_token_from_header)):
+    user_id = resolve_user_id(access_token)
+    require_room_access(user_id, room_id)
+
+    if format not in ("zip", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'zip' or 'ndjson'")
+
+    room_response = supabase.from_("rooms").select("*").eq("id", room_id).maybe_single().execute()
+    if not room_response or not room_response.data:
+        raise HTTPException(status_code=404, detail="Room not found")
+    room = room_response.data
+
+    # Body is generated lazily while the client reads it; nothing is buffered up front
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_room_ndjson(supabase, room),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="room-{room_id}.ndjson"'},
+        )
+    return StreamingResponse(
+        stream_room_zip(supabase, room),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="room-{room_id}.zip"'},
+    )
+
+
 @router.get("/notes/file-url/{note_id}")
 async def get_file_url(request: Request, note_id: int, access_token: str = Depends(get_token_from_header)):
-   
-    try:
-        user = supabase.auth.get_user(access_token).user
-        user_id = user.id
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = resolve_user_id(access_token)
+    require_note_access(user_id, note_id)
 
     # Fetch note to get file_url
     note_response = supabase.from_("notes").select("file_url").eq("id", note_id).single().execute()
@@ -380,24 +385,35 @@ async def get_file_url(request: Request, note_id: int, access_token: str = Depen
 
 
 @router.put("/notes/{note_id}")
-async def update_note_content(note_id: int, payload: dict):
+async def update_note_content(note_id: int, payload: dict, access_token: str = Depends(get_token_from_header)):
     content = payload.get("content")
     if not content:
         raise HTTPException(400, "Missing content")
+
+    # Autosaves hit this constantly; both lookups are served from cache after the first call
+    user_id = resolve_user_id(access_token)
+    room_id = require_note_access(user_id, note_id, WRITE_ROLES)
     
     result = supabase.from_("notes").update({"content": content}).eq("id", note_id).execute()
     
     if result.data is None:
         raise HTTPException(status_code=500, detail="Failed to update note")
+
+    room_summaries.note_updated(room_id)
     
     return { "status": "success", "note": result.data }
 
 
 @router.get("/notes/{note_id}")
-async def get_note(note_id: int):
-    response = supabase.from_("notes").select("content").eq("id", note_id).single().execute()
+async def get_note(note_id: int, access_token: str = Depends(get_token_from_header)):
+    user_id = resolve_user_id(access_token)
+
+    # room_id comes back with the content, so the check needs no extra query
+    response = supabase.from_("notes").select("content, room_id").eq("id", note_id).single().execute()
     if response.data is None:
         raise HTTPException(status_code=404, detail="Note not found")
+    access.remember_note_room(note_id, response.data["room_id"])
+    require_room_access(user_id, response.data["room_id"])
     
     return { "content": response.data["content"] }
 
@@ -406,10 +422,8 @@ async def delete_note(request: Request, note_id: int,access_token: str = Depends
     # access_token = request.cookies.get("access_token")
     # if not access_token:
     #     raise HTTPException(status_code=401, detail="Not logged in")
-    try:
-        user = supabase.auth.get_user(access_token).user
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = resolve_user_id(access_token)
+    room_id = require_note_access(user_id, note_id, WRITE_ROLES)
 
     # First, delete related storage_buckets rows
     supabase.from_("storage_buckets").delete().eq("note_id", note_id).execute()
@@ -417,6 +431,8 @@ async def delete_note(request: Request, note_id: int,access_token: str = Depends
     result = supabase.from_("notes").delete().eq("id", note_id).execute()
     if not result.data:
         raise HTTPException(status_code=404, detail="Note not found or already deleted")
+    access.note_deleted(note_id)
+    room_summaries.note_deleted(room_id, note_id, result.data[0].get("user_id"))
     return {"status": "success", "message": "Note deleted"}
 
 # @router.delete("/rooms/{room_id}")
@@ -440,10 +456,8 @@ async def delete_room(request: Request, room_id: int,access_token: str = Depends
     # access_token = request.cookies.get("access_token")
     # if not access_token:
     #     raise HTTPException(status_code=401, detail="Not logged in")
-    try:
-        user = supabase.auth.get_user(access_token).user
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = resolve_user_id(access_token)
+    require_room_access(user_id, room_id, OWNER_ROLES)
 
     try:
         # Step 1: Delete all notes in the room
@@ -464,6 +478,10 @@ async def delete_room(request: Request, room_id: int,access_token: str = Depends
         if not result.data:
             raise HTTPException(status_code=404, detail="Room not found or already deleted")
 
+        access.room_deleted(room_id)
+        room_summaries.room_deleted(room_id)
+        for note_id in note_ids:
+            access.note_deleted(note_id)
         return {"status": "success", "message": "Room and associated notes deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete room: {str(e)}")
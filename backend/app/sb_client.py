@@ -1,25 +1,6 @@
-# from supabase import create_client
-# import os
-
-# from dotenv import load_dotenv
-# load_dotenv()
-
-# key = os.getenv("SUPABASE_KEY")
-# url = os.getenv("SUPABASE_PURL")
-
-# supabase = create_client(url, key)
-
-# def get_supabase_client():
-#     """
-#     Returns a Supabase client instance.
-#     """
-#     return supabase
-
-
-
 # sb_client.py
-from supabase import create_client
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,13 +8,50 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_PURL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_KEY")  # Make sure this is your anon/public key, not service key
 
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
 def get_supabase_client(access_token: str = None):
     """
     Returns a Supabase client instance.
     If access_token is provided, attach it so RLS works with the logged-in user.
     """
+    # Imported here: supabase pulls in httpx, gotrue, postgrest, storage3 and
+    # realtime, which is most of the app's import time
+    from supabase import create_client
+
     client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
     if access_token:
         # attach user session token so queries run under that user's context
         client.postgrest.auth(access_token)
     return client
+
+
+def get_shared_client():
+    """
+    Returns the process-wide Supabase client, creating it on first use.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = get_supabase_client()
+    return _shared_client
+
+
+def shared_client_ready() -> bool:
+    return _shared_client is not None
+
+
+class _LazyClient:
+    """
+    Stand-in for the shared client that route modules can import at module
+    level; the real client is only built when something is first accessed.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_shared_client(), name)
+
+
+supabase = _LazyClient()
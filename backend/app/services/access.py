@@ -0,0 +1,183 @@
+# app/services/access.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from sb_client import supabase
+
+TOKEN_TTL = 60          # seconds a verified token -> user id mapping is trusted
+ROOMS_TTL = 300         # seconds a user's room/role map is trusted
+MISS_TTL = 5           # seconds a confirmed (user, room) miss is trusted before looking again
+
+READ_ROLES = {"owner", "editor", "viewer"}
+WRITE_ROLES = {"owner", "editor"}
+OWNER_ROLES = {"owner"}
+
+
+class TTLCache:
+    """Small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[object, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def values(self):
+        with self._lock:
+            return [value for value, _ in self._data.values()]
+
+
+class _UserRooms:
+    def __init__(self, roles: Dict[int, str]):
+        self.roles = roles
+
+
+_users_by_token = TTLCache(maxsize=10_000, ttl=TOKEN_TTL)
+_rooms_by_user = TTLCache(maxsize=10_000, ttl=ROOMS_TTL)
+_room_by_note = TTLCache(maxsize=100_000, ttl=24 * 3600)  # a note never changes rooms
+_recent_misses = TTLCache(maxsize=100_000, ttl=MISS_TTL)
+
+
+def resolve_user_id(access_token: str) -> int:
+    """
+    Maps a bearer token to the internal `users.id`. Verified tokens are
+    cached briefly so hot paths (reads, autosaves) skip the two round trips
+    to Supabase Auth and the users table.
+    """
+    key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+    user_id = _users_by_token.get(key)
+    if user_id is not None:
+        return user_id
+
+    try:
+        user = supabase.auth.get_user(access_token).user
+        email = user.email
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    try:
+        profile_response = supabase.from_("users").select("id").eq("email", email).single().execute()
+        user_id = profile_response.data["id"]
+    except Exception:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    _users_by_token.set(key, user_id)
+    return user_id
+
+
+def _load_user_rooms(user_id: int) -> _UserRooms:
+    # Owners are the only role the schema records today (rooms.created_by)
+    rooms_response = supabase.from_("rooms").select("id").eq("created_by", user_id).execute()
+    entry = _UserRooms({room["id"]: "owner" for room in rooms_response.data or []})
+    _rooms_by_user.set(user_id, entry)
+    return entry
+
+
+def prime_user_rooms(user_id: int, rooms: list):
+    """Fills the cache from a rooms listing the caller already fetched."""
+    _rooms_by_user.set(user_id, _UserRooms({room["id"]: "owner" for room in rooms}))
+
+
+def _lookup_room_role(user_id: int, room_id: int) -> Optional[str]:
+    rooms_response = supabase.from_("rooms").select("id").eq("id", room_id).eq("created_by", user_id).execute()
+    return "owner" if rooms_response.data else None
+
+
+def room_role(user_id: int, room_id: int) -> Optional[str]:
+    entry = _rooms_by_user.get(user_id)
+    if entry is None:
+        return _load_user_rooms(user_id).roles.get(room_id)
+
+    role = entry.roles.get(room_id)
+    if role is not None:
+        return role
+
+    # Could be a room created through another worker since we loaded; check
+    # just this room, and only re-check a confirmed miss after MISS_TTL
+    key = (user_id, room_id)
+    if _recent_misses.get(key):
+        return None
+    role = _lookup_room_role(user_id, room_id)
+    if role is None:
+        _recent_misses.set(key, True)
+    else:
+        entry.roles[room_id] = role
+    return role
+
+
+def require_room_access(user_id: int, room_id: int, roles=READ_ROLES) -> str:
+    role = room_role(user_id, room_id)
+    if role is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if role not in roles:
+        raise HTTPException(status_code=403, detail="Not allowed in this room")
+    return role
+
+
+def remember_note_room(note_id: int, room_id: int):
+    _room_by_note.set(note_id, room_id)
+
+
+def note_room(note_id: int) -> int:
+    room_id = _room_by_note.get(note_id)
+    if room_id is not None:
+        return room_id
+    note_response = supabase.from_("notes").select("room_id").eq("id", note_id).maybe_single().execute()
+    if not note_response or not note_response.data:
+        raise HTTPException(status_code=404, detail="Note not found")
+    room_id = note_response.data["room_id"]
+    _room_by_note.set(note_id, room_id)
+    return room_id
+
+
+def require_note_access(user_id: int, note_id: int, roles=READ_ROLES) -> int:
+    """Checks access to the note's room and returns the room id."""
+    room_id = note_room(note_id)
+    require_room_access(user_id, room_id, roles)
+    return room_id
+
+
+# --- Invalidation ---
+def room_created(user_id: int, room_id: int):
+    _recent_misses.pop((user_id, room_id))
+    entry = _rooms_by_user.get(user_id)
+    if entry is not None:
+        entry.roles[room_id] = "owner"
+
+
+def room_deleted(room_id: int):
+    for entry in _rooms_by_user.values():
+        entry.roles.pop(room_id, None)
+
+
+def note_deleted(note_id: int):
+    _room_by_note.pop(note_id)
@@ -0,0 +1,196 @@
+# app/services/renditions.py
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from services.room_export import storage_path_from_url
+
+# name -> longest edge in pixels
+RENDITIONS = {"thumb": 256, "web": 1280}
+RENDITION_FORMAT = "webp"
+RENDITION_CONTENT_TYPE = "image/webp"
+RENDITION_QUALITY = 80
+SIGNED_URL_TTL = 3600
+
+# Extensions (as produced by upload_note) that get renditions
+RENDERABLE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".jpe", ".gif", ".webp", ".bmp", ".tif", ".tiff", ".pdf")
+
+# Canonical renditions live once per content hash under this folder
+HASH_FOLDER = "renditions"
+
+MAX_WORKERS = int(os.getenv("NOSH_RENDITION_WORKERS", "2"))
+HASH_CACHE_SIZE = 4096
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = set()
+
+# Hashes already confirmed to exist in Storage; saves the lookup on repeats
+_known_hashes: "OrderedDict[str, None]" = OrderedDict()
+
+
+def rendition_path(file_path: str, name: str) -> str:
+    """`12/My_Note.png` -> `12/My_Note.thumb.webp` (stored next to the original)."""
+    stem = file_path.rsplit(".", 1)[0] if "." in file_path.rsplit("/", 1)[-1] else file_path
+    return f"{stem}.{name}.{RENDITION_FORMAT}"
+
+
+def hashed_rendition_path(digest: str, name: str) -> str:
+    """`renditions/<sha256>.thumb.webp`: shared by every upload of the same bytes."""
+    return f"{HASH_FOLDER}/{digest}.{name}.{RENDITION_FORMAT}"
+
+
+def is_renderable(file_path: str) -> bool:
+    return file_path.lower().endswith(RENDERABLE_EXTENSIONS)
+
+
+def render_renditions(data: bytes, content_type: str) -> Dict[str, bytes]:
+    """
+    Builds every rendition for one original. Runs inside the process pool,
+    so it only takes and returns plain bytes. PDFs are rasterised from their
+    first page (needs pypdfium2); images need Pillow.
+    """
+    from PIL import Image, ImageOps
+
+    if content_type == "application/pdf":
+        import pypdfium2
+
+        pdf = pypdfium2.PdfDocument(data)
+        try:
+            page = pdf[0]
+            # Render at a scale that covers the largest rendition
+            width, height = page.get_size()
+            scale = max(RENDITIONS.values()) / max(width, height, 1)
+            source = page.render(scale=max(scale, 1.0)).to_pil()
+        finally:
+            pdf.close()
+    else:
+        source = Image.open(io.BytesIO(data))
+        source = ImageOps.exif_transpose(source)
+
+    if source.mode not in ("RGB", "RGBA"):
+        source = source.convert("RGBA" if "A" in source.getbands() else "RGB")
+
+    out = {}
+    for name, edge in RENDITIONS.items():
+        image = source.copy()
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format=RENDITION_FORMAT.upper(), quality=RENDITION_QUALITY, method=4)
+        out[name] = buffer.getvalue()
+    return out
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Not fork: by now the process has anyio, profiler and httpx threads,
+        # and forking under them can deadlock the children
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _remember(digest: str):
+    _known_hashes[digest] = None
+    _known_hashes.move_to_end(digest)
+    while len(_known_hashes) > HASH_CACHE_SIZE:
+        _known_hashes.popitem(last=False)
+
+
+def _hash_rendered(bucket, digest: str) -> bool:
+    if digest in _known_hashes:
+        return True
+    entries = bucket.list(HASH_FOLDER, {"search": digest, "limit": len(RENDITIONS) + 1}) or []
+    names = {entry.get("name") for entry in entries}
+    wanted = {hashed_rendition_path(digest, name).rsplit("/", 1)[-1] for name in RENDITIONS}
+    if wanted <= names:
+        _remember(digest)
+        return True
+    return False
+
+
+async def create_renditions(supabase, file_path: str, data: bytes, content_type: str):
+    """
+    Stores the renditions for an uploaded original. They are rendered once
+    per content hash into `renditions/<sha256>.*` (checked in Storage, so it
+    holds across restarts and workers) and then copied server-side next to
+    the original, where the room listing looks for them.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    bucket = supabase.storage.from_("note-files")
+    loop = asyncio.get_running_loop()
+
+    if not await loop.run_in_executor(None, _hash_rendered, bucket, digest):
+        rendered = await loop.run_in_executor(_get_executor(), render_renditions, data, content_type)
+        for name, body in rendered.items():
+            await loop.run_in_executor(
+                None,
+                lambda path=hashed_rendition_path(digest, name), body=body: bucket.upload(
+                    path=path, file=body,
+                    file_options={"content-type": RENDITION_CONTENT_TYPE, "upsert": "true"},
+                ),
+            )
+        _remember(digest)
+
+    for name in RENDITIONS:
+        await loop.run_in_executor(
+            None, bucket.copy, hashed_rendition_path(digest, name), rendition_path(file_path, name)
+        )
+
+
+def schedule_renditions(supabase, file_path: str, data: bytes, content_type: str):
+    """
+    Kicks off rendition generation without holding up the upload response.
+    Failures are logged; the note just goes without previews.
+    """
+    async def run():
+        try:
+            await create_renditions(supabase, file_path, data, content_type)
+        except Exception:
+            logger.exception("Rendition generation failed for %s", file_path)
+
+    task = asyncio.get_running_loop().create_task(run())
+    # Keep a reference so the task isn't garbage-collected mid-flight
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+def attach_rendition_urls(supabase, notes: List[dict]) -> List[dict]:
+    """
+    Adds a `renditions` dict ({name: signed URL}) to every note whose
+    attachment has previews, using one batched signing call for the page.
+    """
+    wanted = {}
+    for note in notes:
+        file_path = storage_path_from_url(note.get("file_url"))
+        if file_path and is_renderable(file_path):
+            for name in RENDITIONS:
+                wanted[rendition_path(file_path, name)] = (note, name)
+
+    if not wanted:
+        return notes
+
+    signed = supabase.storage.from_("note-files").create_signed_urls(list(wanted), SIGNED_URL_TTL)
+    for item in signed or []:
+        url = item.get("signedURL") or item.get("signedUrl")
+        target = wanted.get(item.get("path"))
+        if item.get("error") or not url or target is None:
+            continue
+        note, name = target
+        note.setdefault("renditions", {})[name] = url
+    return notes
@@ -0,0 +1,193 @@
+# app/services/room_export.py
+
+import json
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+NOTES_PAGE_SIZE = 200          # note rows fetched per query
+STORAGE_CHUNK_SIZE = 64 * 1024 # bytes read from Storage per chunk
+SIGNED_URL_TTL = 600
+
+
+class _ChunkSink:
+    """
+    Write-only file object handed to ZipFile. It has no tell()/seek(), so
+    zipfile falls back to data descriptors and never rewinds; whatever was
+    written since the last drain() is handed back to the response generator.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_room_note_pages(supabase, room_id: int, page_size: int = NOTES_PAGE_SIZE) -> Iterator[List[dict]]:
+    """
+    Yields the notes of a room one page at a time, in id order (keyset
+    pagination, so deep pages cost the same as the first one).
+    """
+    last_id = 0
+    while True:
+        response = (
+            supabase.from_("notes")
+            .select("*")
+            .eq("room_id", room_id)
+            .gt("id", last_id)
+            .order("id")
+            .limit(page_size)
+            .execute()
+        )
+        rows = response.data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def iter_room_notes(supabase, room_id: int, page_size: int = NOTES_PAGE_SIZE) -> Iterator[dict]:
+    """Yields every note in a room, see iter_room_note_pages."""
+    for page in iter_room_note_pages(supabase, room_id, page_size):
+        yield from page
+
+
+def storage_path_from_url(file_url) -> Optional[str]:
+    """
+    Extracts the object path inside the `note-files` bucket from a stored
+    file_url (signed or public URL), or None if it doesn't point there.
+    """
+    if isinstance(file_url, dict):
+        file_url = file_url.get("signedURL") or file_url.get("signedUrl")
+    if not file_url or not isinstance(file_url, str):
+        return None
+    split_marker = "/note-files/"
+    if split_marker not in file_url:
+        return None
+    return file_url.split(split_marker)[-1].split("?")[0] or None
+
+
+def sign_page(supabase, notes: List[dict]) -> Dict[int, Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Signs the attachments of a page of notes with a single batched call.
+    Returns {note_id: (file_path, signed_url, error)} for notes that have one.
+    """
+    paths = {}
+    for note in notes:
+        file_path = storage_path_from_url(note.get("file_url"))
+        if file_path:
+            paths[note["id"]] = file_path
+    if not paths:
+        return {}
+
+    try:
+        signed = supabase.storage.from_("note-files").create_signed_urls(list(set(paths.values())), SIGNED_URL_TTL)
+    except Exception as e:
+        return {note_id: (path, None, f"signing failed: {e}") for note_id, path in paths.items()}
+
+    by_path = {}
+    for item in signed or []:
+        url = item.get("signedURL") or item.get("signedUrl")
+        by_path[item.get("path")] = (url, None) if url and not item.get("error") else (None, str(item.get("error") or "not signed"))
+    return {
+        note_id: (path, *by_path.get(path, (None, "not signed")))
+        for note_id, path in paths.items()
+    }
+
+
+def _safe_name(value: str) -> str:
+    return "".join(c if c.isalnum() or c in ("_", "-", ".") else "_" for c in value).strip("._") or "file"
+
+
+def stream_room_zip(supabase, room: dict) -> Iterator[bytes]:
+    """
+    Streams a ZIP archive of a room: `room.json`, one `notes/<id>.json` per
+    note and the note's attachment under `attachments/<id>/`. Notes are
+    paged and attachments are piped from Storage chunk by chunk, so memory
+    stays flat no matter how big the room is. Attachments that couldn't be
+    fetched, or broke off part-way (left truncated in the archive), are
+    listed in a trailing `errors.json` so a partial backup is never mistaken
+    for a complete one.
+    """
+    import httpx
+
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        archive.writestr("room.json", json.dumps(room, default=str, indent=2))
+        yield sink.drain()
+
+        errors = []
+        with httpx.Client(timeout=httpx.Timeout(30.0, read=None)) as http:
+            for page in iter_room_note_pages(supabase, room["id"]):
+                signed = sign_page(supabase, page)
+                for note in page:
+                    note_id = note["id"]
+                    archive.writestr(f"notes/{note_id}.json", json.dumps(note, default=str, indent=2))
+                    yield sink.drain()
+
+                    if note_id not in signed:
+                        continue
+                    file_path, signed_url, error = signed[note_id]
+                    if not signed_url:
+                        errors.append({"note_id": note_id, "path": file_path, "error": error})
+                        continue
+
+                    entry_name = f"attachments/{note_id}/{_safe_name(file_path.rsplit('/', 1)[-1])}"
+                    written = None  # bytes in the entry, once it has been opened
+                    try:
+                        with http.stream("GET", signed_url) as upstream:
+                            if upstream.status_code != 200:
+                                errors.append({"note_id": note_id, "path": file_path, "error": f"HTTP {upstream.status_code}"})
+                                continue
+                            # Already-compressed media doesn't shrink, so store it as-is
+                            info = zipfile.ZipInfo(entry_name)
+                            info.compress_type = zipfile.ZIP_STORED
+                            with archive.open(info, mode="w", force_zip64=True) as entry:
+                                written = 0
+                                for chunk in upstream.iter_bytes(STORAGE_CHUNK_SIZE):
+                                    entry.write(chunk)
+                                    written += len(chunk)
+                                    yield sink.drain()
+                    except httpx.HTTPError as e:
+                        # The archive stays valid either way: a fetch that fails after the
+                        # entry was opened leaves a truncated file in it, recorded as such
+                        if written is None:
+                            error = type(e).__name__
+                        else:
+                            error = f"truncated after {written} bytes: {type(e).__name__}"
+                        errors.append({"note_id": note_id, "path": file_path, "error": error})
+                    yield sink.drain()
+
+        if errors:
+            archive.writestr("errors.json", json.dumps({"missing_attachments": errors}, indent=2))
+
+    yield sink.drain()
+
+
+def stream_room_ndjson(supabase, room: dict) -> Iterator[bytes]:
+    """
+    Streams a room as newline-delimited JSON: a room record first, then one
+    record per note with a short-lived `attachment_url` instead of the bytes
+    (and `attachment_error` when it couldn't be signed).
+    """
+    yield (json.dumps({"type": "room", "room": room}, default=str) + "\n").encode("utf-8")
+    for page in iter_room_note_pages(supabase, room["id"]):
+        signed = sign_page(supabase, page)
+        for note in page:
+            record = {"type": "note", "note": note, "attachment_url": None}
+            if note["id"] in signed:
+                _, record["attachment_url"], error = signed[note["id"]]
+                if error:
+                    record["attachment_error"] = error
+            yield (json.dumps(record, default=str) + "\n").encode("utf-8")
@@ -0,0 +1,210 @@
+# app/services/room_summaries.py
+
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from sb_client import supabase
+from services.room_export import iter_room_notes, storage_path_from_url
+
+# Autosaves only move last_activity forward at most this often per room
+ACTIVITY_WRITE_INTERVAL = 30
+ROOMS_PAGE_SIZE = 200
+STORAGE_LIST_PAGE_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+_last_activity_write: Dict[int, float] = {}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _apply(room_id: int, function: str, params: dict):
+    """
+    Runs one of the room_summary_* functions (sql/room_summaries.sql), which
+    update the counters atomically in Postgres. A room with no summary row
+    yet is left alone rather than counted up from zero (listings fall back
+    to a count query); the scheduled reconcile builds its row.
+    Never raises into the request that triggered it.
+    """
+    try:
+        response = supabase.rpc(function, {"p_room_id": room_id, **params}).execute()
+        if not response.data:
+            logger.warning("No summary row for room %s yet; left for the scheduled reconcile", room_id)
+    except Exception:
+        logger.exception("Room summary update failed for room %s", room_id)
+
+
+# --- Incremental updates ---
+def room_created(room_id: int):
+    """A new room starts with a zeroed row, so it never needs the fallback or a reconcile."""
+    try:
+        supabase.from_("room_summaries").upsert(
+            {"room_id": room_id}, on_conflict="room_id", ignore_duplicates=True
+        ).execute()
+    except Exception:
+        logger.exception("Room summary creation failed for room %s", room_id)
+
+
+def note_created(room_id: int, note_id: int, user_id: int, attachment_bytes: int = 0):
+    _apply(room_id, "room_summary_note_created",
+           {"p_note_id": note_id, "p_user_id": user_id, "p_bytes": attachment_bytes})
+    _last_activity_write[room_id] = time.monotonic()
+
+
+def note_updated(room_id: int):
+    last = _last_activity_write.get(room_id, 0)
+    if time.monotonic() - last < ACTIVITY_WRITE_INTERVAL:
+        return
+    _last_activity_write[room_id] = time.monotonic()
+    _apply(room_id, "room_summary_touch", {})
+
+
+def note_deleted(room_id: int, note_id: int, user_id: Optional[int]):
+    _apply(room_id, "room_summary_note_deleted", {"p_note_id": note_id, "p_user_id": user_id})
+
+
+def file_uploaded(room_id: int, file_path: str, size: int):
+    _apply(room_id, "room_summary_file_uploaded", {"p_path": file_path, "p_bytes": size})
+
+
+def room_deleted(room_id: int):
+    # The rows themselves go with the room (on delete cascade); just drop local state
+    _last_activity_write.pop(room_id, None)
+
+
+# --- Reading ---
+def attach_summaries(rooms: List[dict]) -> List[dict]:
+    """
+    Flattens the embedded `room_summaries` of a `rooms?select=*,room_summaries(*)`
+    result onto each room. Rooms without a summary yet (created before the
+    table existed, or not reconciled) fall back to a count query.
+    """
+    for room in rooms:
+        summary = room.pop("room_summaries", None)
+        if isinstance(summary, list):
+            summary = summary[0] if summary else None
+        if summary:
+            room["notes_count"] = summary["notes_count"]
+            room["attachment_bytes"] = summary["attachment_bytes"]
+            room["contributor_count"] = summary["contributor_count"]
+            room["last_activity"] = summary["last_activity"]
+        else:
+            note_count_response = supabase.from_("notes").select("id", count="exact").eq("room_id", room["id"]).execute()
+            room["notes_count"] = note_count_response.count or 0
+            room["attachment_bytes"] = None
+            room["contributor_count"] = None
+            room["last_activity"] = None
+    return rooms
+
+
+# --- Reconciliation ---
+def _list_all(bucket: str, folder: str) -> Iterator[dict]:
+    """Every entry of a Storage folder; list() returns at most one page per call."""
+    offset = 0
+    while True:
+        entries = supabase.storage.from_(bucket).list(folder, {
+            "limit": STORAGE_LIST_PAGE_SIZE,
+            "offset": offset,
+            "sortBy": {"column": "name", "order": "asc"},
+        }) or []
+        yield from entries
+        if len(entries) < STORAGE_LIST_PAGE_SIZE:
+            return
+        offset += len(entries)
+
+
+def _folder_sizes(bucket: str, folder: str, cache: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    if folder not in cache:
+        cache[folder] = {
+            entry["name"]: (entry.get("metadata") or {}).get("size", 0)
+            for entry in _list_all(bucket, folder)
+            if entry.get("metadata")
+        }
+    return cache[folder]
+
+
+def reconcile_room(room_id: int) -> dict:
+    """Recomputes one room's summary from `notes` and Storage and overwrites it."""
+    notes_count = 0
+    latest = None
+    attachments: Dict[str, int] = {}
+    contributors: Dict[str, int] = {}
+    note_files: Dict[str, Dict[str, int]] = {}
+
+    for note in iter_room_notes(supabase, room_id):
+        notes_count += 1
+        if note.get("user_id") is not None:
+            key = str(note["user_id"])
+            contributors[key] = contributors.get(key, 0) + 1
+        stamp = note.get("updated_at") or note.get("created_at")
+        if stamp and (latest is None or stamp > latest):
+            latest = stamp
+
+        file_path = storage_path_from_url(note.get("file_url"))
+        if file_path:
+            folder, _, name = file_path.rpartition("/")
+            size = _folder_sizes("note-files", folder, note_files).get(name)
+            if size:
+                attachments[f"note:{note['id']}"] = size
+
+    # Loose room files from /files/upload live under <room_id>/<user_id>/ in the `notes` bucket
+    room_files: Dict[str, Dict[str, int]] = {}
+    for user_folder in _list_all("notes", str(room_id)):
+        if user_folder.get("metadata"):
+            continue  # a file, not a folder
+        folder = f"{room_id}/{user_folder['name']}"
+        for name, size in _folder_sizes("notes", folder, room_files).items():
+            attachments[f"file:{folder}/{name}"] = size
+
+    supabase.rpc("room_summary_replace", {
+        "p_room_id": room_id,
+        "p_notes_count": notes_count,
+        "p_last_activity": latest,
+        "p_attachments": attachments,
+        "p_contributors": contributors,
+    }).execute()
+    return {
+        "room_id": room_id,
+        "notes_count": notes_count,
+        "attachment_bytes": sum(attachments.values()),
+        "contributor_count": len(contributors),
+        "last_activity": latest,
+    }
+
+
+def reconcile_all() -> int:
+    """Reconciles every room, one page of rooms at a time. Returns rooms processed."""
+    done, last_id = 0, 0
+    while True:
+        rooms = (
+            supabase.from_("rooms").select("id").gt("id", last_id).order("id").limit(ROOMS_PAGE_SIZE).execute()
+        ).data or []
+        for room in rooms:
+            try:
+                reconcile_room(room["id"])
+                done += 1
+            except Exception:
+                logger.exception("Room summary reconcile failed for room %s", room["id"])
+        if len(rooms) < ROOMS_PAGE_SIZE:
+            return done
+        last_id = rooms[-1]["id"]
+
+
+if __name__ == "__main__":
+    # Drift correction runs from one scheduler (cron, a k8s CronJob, ...), not
+    # from every API worker. From backend/app:
+    #   python -m services.room_summaries            # every room
+    #   python -m services.room_summaries 12 40      # just these rooms
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    room_ids = [int(arg) for arg in sys.argv[1:]]
+    if room_ids:
+        for room_id in room_ids:
+            reconcile_room(room_id)
+        logger.info("Reconciled %d room summaries", len(room_ids))
+    else:
+        logger.info("Reconciled %d room summaries", reconcile_all())
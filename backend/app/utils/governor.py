@@ -0,0 +1,295 @@
+# app/utils/governor.py
+
+import asyncio
+import hashlib
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `burst` stored."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """Returns (allowed, seconds until enough tokens would be available)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        return False, (cost - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+    def refund(self, cost: float = 1.0):
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+@dataclass
+class Lane:
+    """
+    A pool of concurrent slots with a bounded wait queue. Requests that can't
+    get a slot within `queue_timeout`, or arrive when the queue is full, are
+    turned away instead of piling up on worker threads.
+    """
+    name: str
+    max_concurrency: int
+    max_queue: int
+    queue_timeout: float
+    per_user_concurrency: Optional[int] = None
+
+    in_flight: int = 0
+    waiting: int = 0
+    admitted: int = 0
+    rejected_queue_full: int = 0
+    rejected_timeout: int = 0
+    rejected_user_concurrency: int = 0
+    rejected_priority: int = 0
+    user_in_flight: Dict[str, int] = field(default_factory=dict)
+    _semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_user_concurrency": self.rejected_user_concurrency,
+            "rejected_priority": self.rejected_priority,
+        }
+
+
+@dataclass
+class RouteRule:
+    """
+    Maps requests to a lane. `path` is a regex matched against the full
+    request path; `rate`/`burst` configure the per-user bucket for the route
+    and `route_rate`/`route_burst` an optional bucket shared by all users.
+    """
+    method: str
+    path: str
+    lane: str
+    rate: float
+    burst: float
+    route_rate: Optional[float] = None
+    route_burst: Optional[float] = None
+
+    def __post_init__(self):
+        self._pattern = re.compile(self.path)
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.method == "*" or self.method == method) and bool(self._pattern.fullmatch(path))
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Governor:
+    """
+    Admission control for the API: per-user and per-route token buckets in
+    front of per-lane concurrency pools. Light reads and heavy writes live in
+    separate lanes, and heavy requests are refused outright while reads are
+    queueing, so bulk uploads and room deletes can't starve everyone else.
+    """
+
+    MAX_TRACKED_BUCKETS = 10_000
+
+    def __init__(self, lanes: List[Lane], rules: List[RouteRule], default_rule: RouteRule, priority_lane: str):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.rules = rules
+        self.default_rule = default_rule
+        self.priority_lane = priority_lane
+        self.rejected_rate_limited = 0
+        self._user_buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._route_buckets: Dict[str, TokenBucket] = {}
+
+    def rule_for(self, method: str, path: str) -> RouteRule:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return self.default_rule
+
+    def _user_bucket(self, rule: RouteRule, user_key: str) -> TokenBucket:
+        key = (rule.path, user_key)
+        bucket = self._user_buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rule.rate, rule.burst)
+            self._user_buckets[key] = bucket
+            if len(self._user_buckets) > self.MAX_TRACKED_BUCKETS:
+                self._user_buckets.popitem(last=False)
+        else:
+            self._user_buckets.move_to_end(key)
+        return bucket
+
+    def check_rate(self, rule: RouteRule, user_key: str):
+        # Per-user bucket first: a caller over their own limit must not drain
+        # the shared route bucket that everyone else depends on
+        user_bucket = self._user_bucket(rule, user_key)
+        allowed, retry_after = user_bucket.take()
+        if not allowed:
+            self.rejected_rate_limited += 1
+            raise Rejected(429, "Too many requests", retry_after)
+
+        if rule.route_rate is not None:
+            bucket = self._route_buckets.get(rule.path)
+            if bucket is None:
+                bucket = self._route_buckets[rule.path] = TokenBucket(rule.route_rate, rule.route_burst or rule.route_rate)
+            allowed, retry_after = bucket.take()
+            if not allowed:
+                # Not the caller's fault, so don't charge them for it
+                user_bucket.refund()
+                self.rejected_rate_limited += 1
+                raise Rejected(503, "Endpoint is busy, try again shortly", retry_after)
+
+    def refund_rate(self, rule: RouteRule, user_key: str):
+        """Gives back the tokens check_rate() took, for a request turned away afterwards."""
+        self._user_bucket(rule, user_key).refund()
+        if rule.route_rate is not None:
+            bucket = self._route_buckets.get(rule.path)
+            if bucket is not None:
+                bucket.refund()
+
+    async def acquire(self, lane: Lane, user_key: str):
+        priority = self.lanes.get(self.priority_lane)
+        if lane is not priority and priority is not None and priority.waiting > 0:
+            lane.rejected_priority += 1
+            raise Rejected(503, "Server busy, try again shortly", 1)
+
+        if lane.per_user_concurrency is not None and lane.user_in_flight.get(user_key, 0) >= lane.per_user_concurrency:
+            lane.rejected_user_concurrency += 1
+            raise Rejected(429, "Too many concurrent requests", 1)
+
+        if lane.semaphore.locked() and lane.waiting >= lane.max_queue:
+            lane.rejected_queue_full += 1
+            raise Rejected(503, "Server busy, try again shortly", 1)
+
+        # Counted per user from the moment it queues, so one caller can't fill the queue
+        lane.user_in_flight[user_key] = lane.user_in_flight.get(user_key, 0) + 1
+        if not lane.semaphore.locked():
+            # Free slot: take it without a timeout task, so the next caller sees it as taken
+            await lane.semaphore.acquire()
+            lane.in_flight += 1
+            lane.admitted += 1
+            return
+
+        lane.waiting += 1
+        try:
+            await asyncio.wait_for(lane.semaphore.acquire(), timeout=lane.queue_timeout)
+        except asyncio.TimeoutError:
+            lane.rejected_timeout += 1
+            self._forget_user(lane, user_key)
+            raise Rejected(503, "Server busy, try again shortly", lane.queue_timeout)
+        except BaseException:
+            self._forget_user(lane, user_key)
+            raise
+        finally:
+            lane.waiting -= 1
+
+        lane.in_flight += 1
+        lane.admitted += 1
+
+    def release(self, lane: Lane, user_key: str):
+        lane.in_flight -= 1
+        self._forget_user(lane, user_key)
+        lane.semaphore.release()
+
+    @staticmethod
+    def _forget_user(lane: Lane, user_key: str):
+        remaining = lane.user_in_flight.get(user_key, 1) - 1
+        if remaining:
+            lane.user_in_flight[user_key] = remaining
+        else:
+            lane.user_in_flight.pop(user_key, None)
+
+    def stats(self) -> dict:
+        return {
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "tracked_user_buckets": len(self._user_buckets),
+        }
+
+
+def user_key_for(scope) -> str:
+    """
+    Identifies the caller without hitting Supabase: a hash of the bearer
+    token or access_token cookie, falling back to the client address.
+    """
+    headers = Headers(scope=scope)
+    token = None
+    authorization = headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    if not token:
+        for part in headers.get("cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "access_token" and value:
+                token = value
+                break
+    if token:
+        return "t:" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class GovernorMiddleware:
+    def __init__(self, app, governor: Governor, exempt_paths: Tuple[str, ...] = ()):
+        self.app = app
+        self.governor = governor
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.governor.rule_for(scope["method"], scope["path"])
+        lane = self.governor.lanes[rule.lane]
+        user_key = user_key_for(scope)
+
+        try:
+            self.governor.check_rate(rule, user_key)
+            try:
+                await self.governor.acquire(lane, user_key)
+            except Rejected as e:
+                # A busy lane (503) is not the caller's fault, so don't charge them for it
+                if e.status_code == 503:
+                    self.governor.refund_rate(rule, user_key)
+                raise
+        except Rejected as e:
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.governor.release(lane, user_key)
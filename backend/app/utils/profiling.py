@@ -0,0 +1,333 @@
+# app/utils/profiling.py
+
+import asyncio
+import contextvars
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+# All off unless configured:
+#   NOSH_PROFILE_RATE      fraction of requests to sample (0.0 - 1.0)
+#   NOSH_PROFILE_ROUTES    comma-separated path prefixes that are always sampled
+#   NOSH_SLOW_REQUEST_MS   capture a stack + upstream trace for requests slower than this
+#   NOSH_PROFILE_INTERVAL_MS, NOSH_PROFILE_BUFFER
+PROFILE_RATE = float(os.getenv("NOSH_PROFILE_RATE", "0"))
+PROFILE_ROUTES = tuple(p for p in os.getenv("NOSH_PROFILE_ROUTES", "").split(",") if p)
+SLOW_REQUEST_MS = float(os.getenv("NOSH_SLOW_REQUEST_MS", "0"))
+SAMPLE_INTERVAL = float(os.getenv("NOSH_PROFILE_INTERVAL_MS", "5")) / 1000
+BUFFER_SIZE = int(os.getenv("NOSH_PROFILE_BUFFER", "100"))
+
+MAX_STACK_DEPTH = 64
+MAX_UPSTREAM_CALLS = 200
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("nosh_profile_trace", default=None)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame) -> str:
+    """Root-first `a;b;c` stack string, the format flamegraph.pl/speedscope read."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _await_chain(coro) -> List:
+    """Frames of a suspended coroutine and everything it awaits, outermost first."""
+    frames = []
+    while coro is not None and len(frames) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is not None:
+            frames.append(frame)
+        coro = (getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+                or getattr(coro, "ag_await", None))
+    return frames
+
+
+def _task_stack(task, loop_frame) -> Optional[str]:
+    """
+    Stack of one request's asyncio task. While the task is running, the loop
+    thread's frame is its stack; while it is suspended, the loop thread is
+    busy with other requests, so the task's own await chain is used instead.
+    """
+    if task.done():
+        return None
+    coro = task.get_coro()
+    if getattr(coro, "cr_running", False):
+        return _collapse(loop_frame) if loop_frame is not None else None
+    frames = _await_chain(coro)
+    if not frames:
+        return None
+    return ";".join(_frame_name(frame) for frame in frames)
+
+
+class RequestTrace:
+    def __init__(self, method: str, path: str, task: Optional[asyncio.Task], sampled: bool):
+        self.id = None
+        self.method = method
+        self.path = path
+        self.task = task
+        self.loop_thread_id = threading.get_ident()
+        # Threadpool workers currently running sync code for this request
+        self.thread_ids = set()
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.samples: Counter = Counter()
+        self.slow_stacks: Dict[object, str] = {}
+        self.upstream: List[dict] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms or 0, 2),
+            "sampled": self.sampled,
+            "samples": sum(self.samples.values()),
+            "slow": bool(self.slow_stacks),
+            "upstream_calls": len(self.upstream),
+        }
+
+    def detail(self) -> dict:
+        data = self.summary()
+        data["upstream"] = self.upstream
+        data["slow_stacks"] = list(self.slow_stacks.values())
+        data["top_stacks"] = [{"stack": s, "count": c} for s, c in self.samples.most_common(20)]
+        return data
+
+    def collapsed(self) -> str:
+        lines = [f"{stack} {count}" for stack, count in self.samples.items()]
+        lines += [f"{stack} 1" for stack in self.slow_stacks.values()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+class Profiler:
+    """
+    Opt-in request profiler. A single background thread samples the stack of
+    each sampled request (its asyncio task, plus any threadpool worker running
+    sync code for it) and snapshots the stack of any request that runs past
+    the slow threshold. Finished traces that were sampled or
+    slow land in a bounded ring buffer for the admin endpoints.
+    """
+
+    def __init__(self, rate: float = PROFILE_RATE, routes=PROFILE_ROUTES, slow_ms: float = SLOW_REQUEST_MS,
+                 interval: float = SAMPLE_INTERVAL, buffer_size: int = BUFFER_SIZE):
+        self.rate = rate
+        self.routes = tuple(routes)
+        self.slow_ms = slow_ms
+        self.interval = interval
+        self.traces: deque = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+        self._active: Dict[int, RequestTrace] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 or bool(self.routes) or self.slow_ms > 0
+
+    def should_sample(self, path: str) -> bool:
+        if self.routes and path.startswith(self.routes):
+            return True
+        return self.rate > 0 and random.random() < self.rate
+
+    def start(self, method: str, path: str, task: Optional[asyncio.Task] = None) -> Optional[RequestTrace]:
+        if not self.enabled:
+            return None
+        trace = RequestTrace(method, path, task, self.should_sample(path))
+        with self._lock:
+            self._active[id(trace)] = trace
+        self._ensure_thread()
+        return trace
+
+    def finish(self, trace: RequestTrace, status: Optional[int]):
+        trace.duration_ms = trace.elapsed_ms()
+        trace.status = status
+        trace.task = None
+        with self._lock:
+            self._active.pop(id(trace), None)
+        if trace.sampled or trace.slow_stacks or (self.slow_ms and trace.duration_ms >= self.slow_ms):
+            trace.id = next(self._ids)
+            self.traces.append(trace)
+
+    def get(self, trace_id: int) -> Optional[RequestTrace]:
+        for trace in self.traces:
+            if trace.id == trace_id:
+                return trace
+        return None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="nosh-profiler", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for trace in active:
+                slow = self.slow_ms and trace.elapsed_ms() >= self.slow_ms
+                if not trace.sampled and not (slow and not trace.slow_stacks):
+                    continue
+                try:
+                    thread_ids = list(trace.thread_ids)
+                except RuntimeError:  # a worker thread joined/left mid-copy; catch it next tick
+                    continue
+                stacks = []
+                for thread_id in thread_ids:
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks.append((thread_id, _collapse(frame)))
+                task = trace.task
+                if not stacks and task is not None:
+                    # Waiting on a worker thread is already covered by that thread's stack
+                    try:
+                        stack = _task_stack(task, frames.get(trace.loop_thread_id))
+                    except (RuntimeError, AttributeError):  # the task moved on mid-read
+                        stack = None
+                    if stack:
+                        stacks.append(("task", stack))
+                for key, stack in stacks:
+                    if trace.sampled:
+                        trace.samples[stack] += 1
+                    if slow and key not in trace.slow_stacks:
+                        trace.slow_stacks[key] = stack
+
+
+profiler = Profiler()
+
+
+def _record_upstream(method: str, url: str, started: float, status: Optional[int], error: Optional[str]):
+    trace = _current_trace.get()
+    if trace is None or len(trace.upstream) >= MAX_UPSTREAM_CALLS:
+        return
+    trace.upstream.append({
+        "method": method,
+        "url": url.split("?")[0],
+        "offset_ms": round((started - trace.started) * 1000, 2),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        "status": status,
+        "error": error,
+    })
+
+
+_instrumented = False
+
+
+def instrument():
+    """
+    Installs the two hooks tracing needs:
+      - httpx's send() (what supabase-py uses for PostgREST, Auth and Storage)
+        is wrapped so upstream calls made while a request is traced are timed;
+      - anyio.to_thread.run_sync (how sync handlers reach the threadpool) is
+        wrapped so the sampler also watches the worker thread running them.
+    Both cost one context-var lookup per call when the request isn't traced.
+    """
+    global _instrumented
+    if _instrumented:
+        return
+    import anyio.to_thread
+    import httpx
+
+    original_send = httpx.Client.send
+    original_async_send = httpx.AsyncClient.send
+
+    def send(self, request, *args, **kwargs):
+        if _current_trace.get() is None:
+            return original_send(self, request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            response = original_send(self, request, *args, **kwargs)
+        except Exception as e:
+            _record_upstream(request.method, str(request.url), started, None, type(e).__name__)
+            raise
+        _record_upstream(request.method, str(request.url), started, response.status_code, None)
+        return response
+
+    async def async_send(self, request, *args, **kwargs):
+        if _current_trace.get() is None:
+            return await original_async_send(self, request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            response = await original_async_send(self, request, *args, **kwargs)
+        except Exception as e:
+            _record_upstream(request.method, str(request.url), started, None, type(e).__name__)
+            raise
+        _record_upstream(request.method, str(request.url), started, response.status_code, None)
+        return response
+
+    original_run_sync = anyio.to_thread.run_sync
+
+    async def run_sync(func, *args, **kwargs):
+        trace = _current_trace.get()
+        if trace is None:
+            return await original_run_sync(func, *args, **kwargs)
+
+        def watched(*inner_args):
+            thread_id = threading.get_ident()
+            trace.thread_ids.add(thread_id)
+            try:
+                return func(*inner_args)
+            finally:
+                trace.thread_ids.discard(thread_id)
+
+        return await original_run_sync(watched, *args, **kwargs)
+
+    httpx.Client.send = send
+    httpx.AsyncClient.send = async_send
+    anyio.to_thread.run_sync = run_sync
+    _instrumented = True
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, profiler: Profiler = profiler, exclude_prefixes=("/admin/profiles",)):
+        self.app = app
+        self.profiler = profiler
+        self.exclude_prefixes = tuple(exclude_prefixes)
+        if profiler.enabled:
+            instrument()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled or scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        trace = self.profiler.start(scope["method"], scope["path"], asyncio.current_task())
+        token = _current_trace.set(trace)
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            self.profiler.finish(trace, status)
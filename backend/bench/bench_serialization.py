@@ -0,0 +1,158 @@
+"""
+Serialization / compression benchmark for the big JSON routes.
+
+Builds synthetic payloads shaped like `list_rooms` and `get_notes_by_room`
+responses and reports, per route:
+  - render time with the stock JSONResponse vs FastJSONResponse
+  - bytes on the wire for identity / gzip / br through CompressionMiddleware
+
+Usage (from backend/):
+    python bench/bench_serialization.py [--notes 200] [--rooms 50] [--repeat 50]
+"""
+
+import argparse
+import collections
+import email
+import http.client
+import inspect
+import os
+import random
+import re
+import string
+import sys
+import textwrap
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from utils.compression import CompressionMiddleware, brotli
+from utils.responses import FastJSONResponse, orjson
+
+def _load_sentences() -> list:
+    """
+    Real English prose for note bodies. A tiny word list compresses in ways
+    real notes don't (it made gzip look better than brotli), so sentences are
+    taken from stdlib docstrings instead.
+    """
+    modules = (argparse, collections, email, http.client, textwrap, zipfile)
+    text = " ".join(inspect.getdoc(obj) or "" for module in modules for _, obj in inspect.getmembers(module))
+    sentences = re.split(r"(?<=[.!?])\s+", text.replace("\n", " "))
+    return [s.strip().replace("<", "&lt;").replace(">", "&gt;") for s in sentences if 30 < len(s.strip()) < 250]
+
+
+SENTENCES = _load_sentences()
+
+
+def _html_content(rng: random.Random, blocks: int) -> str:
+    """Quill-style editor HTML: paragraphs with inline bold, headings, lists and quotes."""
+    parts = []
+    for _ in range(blocks):
+        kind = rng.random()
+        text = " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 4)))
+        if kind < 0.1:
+            parts.append(f"<h2>{text[:60]}</h2>")
+        elif kind < 0.25:
+            items = "".join(f"<li>{rng.choice(SENTENCES)}</li>" for _ in range(rng.randint(2, 5)))
+            parts.append(f"<ul>{items}</ul>")
+        elif kind < 0.3:
+            parts.append(f"<blockquote>{text}</blockquote>")
+        else:
+            words = text.split(" ")
+            i = rng.randrange(len(words))
+            words[i] = f"<strong>{words[i]}</strong>"
+            parts.append(f"<p>{' '.join(words)}</p>")
+    return "".join(parts)
+
+
+def make_notes(count: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    notes = []
+    for i in range(count):
+        notes.append({
+            "id": i + 1,
+            "room_id": 1,
+            "user_id": rng.randint(1, 20),
+            "title": rng.choice(SENTENCES)[:40],
+            "content": _html_content(rng, rng.randint(3, 12)),
+            "file_url": None if i % 3 else f"https://example.supabase.co/storage/v1/object/sign/note-files/{i}/"
+                                             + "".join(rng.choice(string.ascii_letters) for _ in range(12)) + ".pdf",
+            "created_at": "2025-07-15T10:%02d:00.000000+00:00" % (i % 60),
+        })
+    return {"notes": notes}
+
+
+def make_rooms(count: int, seed: int = 2) -> dict:
+    rng = random.Random(seed)
+    rooms = []
+    for i in range(count):
+        rooms.append({
+            "id": i + 1,
+            "name": rng.choice(SENTENCES)[:30],
+            "created_by": 1,
+            "created_at": "2025-07-15T10:%02d:00.000000+00:00" % (i % 60),
+            "notes_count": rng.randint(0, 300),
+        })
+    return {"status": "success", "rooms": rooms}
+
+
+def time_render(response_class, payload, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response_class(content=payload)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def build_app(payloads: dict) -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    for name, payload in payloads.items():
+        app.add_api_route(f"/{name}", (lambda p=payload: p), methods=["GET"])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    payloads = {
+        "get_notes_by_room": make_notes(args.notes),
+        "list_rooms": make_rooms(args.rooms),
+    }
+    client = TestClient(build_app(payloads))
+
+    print(f"orjson: {'yes' if orjson else 'no (stdlib fallback)'}   brotli: {'yes' if brotli else 'no'}")
+    print(f"{'route':<20}{'json ms':>10}{'fast ms':>10}{'speedup':>9}"
+          f"{'identity B':>13}{'gzip B':>10}{'br B':>10}{'e2e ms':>9}")
+
+    for name, payload in payloads.items():
+        stock = time_render(JSONResponse, payload, args.repeat)
+        fast = time_render(FastJSONResponse, payload, args.repeat)
+
+        sizes = {}
+        for encoding in ("identity", "gzip", "br"):
+            if encoding == "br" and brotli is None:
+                sizes[encoding] = "-"
+                continue
+            response = client.get(f"/{name}", headers={"Accept-Encoding": encoding})
+            # Content-Length is the compressed size; .content would be decoded
+            sizes[encoding] = response.headers.get("content-length", str(len(response.content)))
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            client.get(f"/{name}", headers={"Accept-Encoding": "br, gzip"})
+        e2e = (time.perf_counter() - start) / args.repeat * 1000
+
+        print(f"{name:<20}{stock:>10.3f}{fast:>10.3f}{stock / fast:>8.1f}x"
+              f"{sizes['identity']:>13}{sizes['gzip']:>10}{sizes['br']:>10}{e2e:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
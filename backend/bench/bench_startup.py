@@ -0,0 +1,87 @@
+"""
+Cold-start benchmark for the API.
+
+Each run happens in a fresh interpreter (so nothing is cached in
+sys.modules) and reports:
+  - wall time to `import main`
+  - the slowest modules from `python -X importtime`
+  - latency of the first request to /health/live and, with --ready, to
+    /health/ready (which builds the shared Supabase client)
+
+Usage (from backend/):
+    python bench/bench_startup.py [--runs 5] [--ready] [--top 15]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+from starlette.testclient import TestClient
+client = TestClient(main.app)
+result = {"import_ms": (t1 - t0) * 1000}
+with client:
+    for path in sys.argv[1:]:
+        start = time.perf_counter()
+        status = client.get(path).status_code
+        result[path] = {"ms": (time.perf_counter() - start) * 1000, "status": status}
+print(json.dumps(result))
+"""
+
+
+def run_probe(paths):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, *paths],
+        cwd=APP_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=APP_DIR, capture_output=True, text=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.split("|")]
+        rows.append((int(cumulative_us), int(self_us.split(":")[-1]), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ready", action="store_true", help="also time the first /health/ready call")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    paths = ["/health/live"] + (["/health/ready"] if args.ready else [])
+    runs = [run_probe(paths) for _ in range(args.runs)]
+
+    def summary(values):
+        return f"median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms   max {max(values):8.1f} ms"
+
+    print(f"import main          {summary([r['import_ms'] for r in runs])}")
+    for path in paths:
+        statuses = sorted({r[path]['status'] for r in runs})
+        print(f"first {path:<14} {summary([r[path]['ms'] for r in runs])}   status {statuses}")
+
+    print("\nslowest imports (cumulative us, self us):")
+    for cumulative, self_time, name in slowest_imports(args.top):
+        print(f"  {cumulative:>9} {self_time:>9}  {name}")
+
+
+if __name__ == "__main__":
+    main()
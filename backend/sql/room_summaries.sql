@@ -0,0 +1,170 @@
+-- Precomputed per-room dashboard numbers, maintained by services/room_summaries.py.
+-- The foreign key lets PostgREST embed it (rooms?select=*,room_summaries(*))
+-- and removes the summary together with its room.
+create table if not exists public.room_summaries (
+    room_id           bigint primary key references public.rooms (id) on delete cascade,
+    notes_count       integer     not null default 0,
+    attachment_bytes  bigint      not null default 0,
+    contributor_count integer     not null default 0,
+    last_activity     timestamptz,
+    updated_at        timestamptz not null default now()
+);
+
+-- Bookkeeping for incremental updates, one row per item so an update only
+-- touches what changed: attachment key (note:<id> / file:<path>) -> bytes ...
+create table if not exists public.room_summary_attachments (
+    room_id bigint not null references public.room_summaries (room_id) on delete cascade,
+    key     text   not null,
+    bytes   bigint not null,
+    primary key (room_id, key)
+);
+
+-- ... and user id -> number of notes they have in the room.
+create table if not exists public.room_summary_contributors (
+    room_id     bigint  not null references public.room_summaries (room_id) on delete cascade,
+    user_id     bigint  not null,
+    notes_count integer not null,
+    primary key (room_id, user_id)
+);
+
+
+-- Incremental updates. Each runs in one transaction holding the summary row
+-- lock, so concurrent workers can't lose each other's changes. They return
+-- false (and change nothing) when the room has no summary row yet; rooms get
+-- one on creation, older rooms from the scheduled reconcile (room_summary_replace).
+
+create or replace function public.room_summary_note_created(
+    p_room_id bigint, p_note_id bigint, p_user_id bigint, p_bytes bigint
+) returns boolean language plpgsql as $$
+declare
+    v_contributor_notes integer;
+begin
+    perform 1 from public.room_summaries where room_id = p_room_id for update;
+    if not found then
+        return false;
+    end if;
+
+    if p_bytes > 0 then
+        insert into public.room_summary_attachments (room_id, key, bytes)
+        values (p_room_id, 'note:' || p_note_id, p_bytes)
+        on conflict (room_id, key) do nothing;
+        if not found then
+            p_bytes := 0;
+        end if;
+    end if;
+
+    insert into public.room_summary_contributors (room_id, user_id, notes_count)
+    values (p_room_id, p_user_id, 1)
+    on conflict (room_id, user_id) do update
+        set notes_count = room_summary_contributors.notes_count + 1
+    returning notes_count into v_contributor_notes;
+
+    update public.room_summaries set
+        notes_count       = notes_count + 1,
+        attachment_bytes  = attachment_bytes + greatest(p_bytes, 0),
+        contributor_count = contributor_count + (case when v_contributor_notes = 1 then 1 else 0 end),
+        last_activity     = now(),
+        updated_at        = now()
+    where room_id = p_room_id;
+    return true;
+end;
+$$;
+
+create or replace function public.room_summary_note_deleted(
+    p_room_id bigint, p_note_id bigint, p_user_id bigint
+) returns boolean language plpgsql as $$
+declare
+    v_bytes bigint;
+    v_contributor_notes integer;
+begin
+    perform 1 from public.room_summaries where room_id = p_room_id for update;
+    if not found then
+        return false;
+    end if;
+
+    delete from public.room_summary_attachments
+    where room_id = p_room_id and key = 'note:' || p_note_id
+    returning bytes into v_bytes;
+
+    update public.room_summary_contributors
+    set notes_count = notes_count - 1
+    where room_id = p_room_id and user_id = p_user_id
+    returning notes_count into v_contributor_notes;
+    if v_contributor_notes is not null and v_contributor_notes <= 0 then
+        delete from public.room_summary_contributors where room_id = p_room_id and user_id = p_user_id;
+    end if;
+
+    update public.room_summaries set
+        notes_count       = greatest(notes_count - 1, 0),
+        attachment_bytes  = greatest(attachment_bytes - coalesce(v_bytes, 0), 0),
+        contributor_count = greatest(contributor_count
+                                     - (case when v_contributor_notes <= 0 then 1 else 0 end), 0),
+        last_activity     = now(),
+        updated_at        = now()
+    where room_id = p_room_id;
+    return true;
+end;
+$$;
+
+create or replace function public.room_summary_file_uploaded(
+    p_room_id bigint, p_path text, p_bytes bigint
+) returns boolean language plpgsql as $$
+declare
+    v_previous bigint;
+begin
+    perform 1 from public.room_summaries where room_id = p_room_id for update;
+    if not found then
+        return false;
+    end if;
+
+    select bytes into v_previous from public.room_summary_attachments
+    where room_id = p_room_id and key = 'file:' || p_path;
+
+    insert into public.room_summary_attachments (room_id, key, bytes)
+    values (p_room_id, 'file:' || p_path, p_bytes)
+    on conflict (room_id, key) do update set bytes = excluded.bytes;
+
+    update public.room_summaries set
+        attachment_bytes = attachment_bytes + p_bytes - coalesce(v_previous, 0),
+        last_activity    = now(),
+        updated_at       = now()
+    where room_id = p_room_id;
+    return true;
+end;
+$$;
+
+create or replace function public.room_summary_touch(p_room_id bigint) returns boolean language sql as $$
+    update public.room_summaries set last_activity = now(), updated_at = now()
+    where room_id = p_room_id
+    returning true;
+$$;
+
+
+-- Full rebuild of one room from values recomputed by reconcile_room():
+-- p_attachments is {key: bytes}, p_contributors is {user_id: notes_count}.
+create or replace function public.room_summary_replace(
+    p_room_id bigint, p_notes_count integer, p_last_activity timestamptz,
+    p_attachments jsonb, p_contributors jsonb
+) returns void language plpgsql as $$
+begin
+    insert into public.room_summaries (room_id) values (p_room_id)
+    on conflict (room_id) do nothing;
+    perform 1 from public.room_summaries where room_id = p_room_id for update;
+
+    delete from public.room_summary_attachments where room_id = p_room_id;
+    insert into public.room_summary_attachments (room_id, key, bytes)
+    select p_room_id, item.key, item.value::bigint from jsonb_each_text(p_attachments) as item;
+
+    delete from public.room_summary_contributors where room_id = p_room_id;
+    insert into public.room_summary_contributors (room_id, user_id, notes_count)
+    select p_room_id, item.key::bigint, item.value::integer from jsonb_each_text(p_contributors) as item;
+
+    update public.room_summaries set
+        notes_count       = p_notes_count,
+        attachment_bytes  = (select coalesce(sum(bytes), 0) from public.room_summary_attachments where room_id = p_room_id),
+        contributor_count = (select count(*) from public.room_summary_contributors where room_id = p_room_id),
+        last_activity     = p_last_activity,
+        updated_at        = now()
+    where room_id = p_room_id;
+end;
+$$;
@@ -2,7 +2,8 @@
 
 import { useState, useEffect, useRef } from "react";
 import { useRouter, useParams } from "next/navigation";
-import axios from "axios";
+import api from "@/app/lib/api";
+import { supabase } from "@/app/lib/supabaseClient";
 import { io, Socket } from "socket.io-client";
 import Navbar from "@/components/navbar";
 import { Button } from "@/components/ui/button";
@@ -17,6 +18,15 @@ const API_BASE_URL =
 const SOCKET_URL =
   process.env.NEXT_PUBLIC_SOCKET_URL || "http://localhost:4000";
 
+// The realtime server loads and saves the note on the user's behalf,
+// so every call it makes needs the user's token
+const getAccessToken = async () => {
+  const {
+    data: { session },
+  } = await supabase.auth.getSession();
+  return session?.access_token;
+};
+
 interface Note {
   id: string;
   title: string;
@@ -88,7 +98,7 @@ export default function CollaborativeEditor() {
   const fetchNote = async () => {
     try {
       // ✅ FIXED: Corrected API endpoint path
-      const response = await axios.get(`${API_BASE_URL}/notes/notes/${noteId}`, {
+      const response = await api.get(`${API_BASE_URL}/notes/notes/${noteId}`, {
         withCredentials: true,
       });
       setNote(response.data);
@@ -107,8 +117,8 @@ export default function CollaborativeEditor() {
     const socket = io(SOCKET_URL);
     socketRef.current = socket;
 
-    socket.on("connect", () => {
-      socket.emit("join-room", noteId);
+    socket.on("connect", async () => {
+      socket.emit("join-room", noteId, await getAccessToken());
     });
 
     socket.on("receive-changes", (delta) => {
@@ -131,14 +141,18 @@ export default function CollaborativeEditor() {
       const content = quillRef.current.root.innerHTML;
 
       // ✅ FIXED: Corrected API endpoint path
-      await axios.put(
+      await api.put(
         `${API_BASE_URL}/notes/notes/${noteId}`,
         { title, content },
         { withCredentials: true }
       );
 
       // Also emit to socket server for in-memory sync on other clients
-      socketRef.current?.emit("save-note", { noteId, data: content });
+      socketRef.current?.emit("save-note", {
+        noteId,
+        data: content,
+        token: await getAccessToken(),
+      });
     } catch (err) {
       setError("Failed to save note");
     } finally {
@@ -18,12 +18,19 @@ const io = new Server(server, {
 
 const notes = {};
 
+// The API checks room access, so calls go out with the user's own token
+const authHeaders = (token) =>
+  token ? { headers: { Authorization: `Bearer ${token}` } } : {};
+
 io.on("connection", (socket) => {
   console.log("User connected:", socket.id);
 
- socket.on("join-room", async (noteId) => {
+ socket.on("join-room", async (noteId, token) => {
   try {
-    const res = await axios.get(`http://localhost:8000/notes/notes/${noteId}`);
+    const res = await axios.get(
+      `http://localhost:8000/notes/notes/${noteId}`,
+      authHeaders(token)
+    );
     const content = res.data.content || "";
     socket.join(noteId);
     socket.emit("load-note", content); // ✅ already a string — don't JSON.stringify
@@ -42,11 +49,13 @@ io.on("connection", (socket) => {
     notes[noteId] = data;
   });
 
-  socket.on("save-note", async ({ noteId, data }) => {
+  socket.on("save-note", async ({ noteId, data, token }) => {
     try {
-      await axios.put(`http://localhost:8000/notes/notes/${noteId}`, {
-        content: data, // store as JSON string
-      });
+      await axios.put(
+        `http://localhost:8000/notes/notes/${noteId}`,
+        { content: data }, // store as JSON string
+        authHeaders(token)
+      );
     } catch (err) {
       console.error("Failed to save note:", err.message);
     }